@@ -1,11 +1,23 @@
 import os
+import atexit
+import io
 import re
+import math
+import json
+import time
 import asyncio
+import random
+import heapq
+import bisect
+import hashlib
 import aiohttp
 import tweepy
-import requests
-import tempfile
+import ijson
+import orjson
+import ciso8601
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from urllib.parse import quote_plus
 from dotenv import load_dotenv
 from typing import List, Optional, TypedDict
 
@@ -19,7 +31,41 @@ from langchain_core.messages import SystemMessage, HumanMessage
 # ---------------------------------------------------------------------------
 load_dotenv()
 
-llm = UiPathChat(model="gpt-4o-mini-2024-07-18")
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    news_api_key: Optional[str]
+    topic_default: str
+    auto_post: bool
+    num_tweets: int
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        print(f"⚠️ Invalid {name}={raw!r}, falling back to {default}")
+        return default
+
+
+# Read once at import; nodes use CFG instead of hitting os.environ per run
+CFG = Config(
+    news_api_key=os.getenv("News_Api_Key"),
+    topic_default=os.getenv("NEWS_TOPIC", "india"),
+    auto_post=os.getenv("AUTO_POST_TWEETS", "false").lower() == "true",
+    num_tweets=_env_int("NUM_TWEETS_TO_POST", 2),
+)
+
+_NEWS_URL_TEMPLATE = (
+    "https://newsapi.org/v2/everything?q={topic}&language=en&pageSize=20"
+    "&sortBy=publishedAt&apiKey={key}"
+)
+
+LLM_MODEL = "gpt-4o-mini-2024-07-18"
+llm = UiPathChat(model=LLM_MODEL)
 
 try:
     twitter_client = tweepy.Client(
@@ -50,6 +96,57 @@ except Exception as e:
     twitter_api_v1 = None
 
 
+# Shared aiohttp session (created lazily so it binds to the running event loop)
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _discard_session(session: aiohttp.ClientSession, loop: asyncio.AbstractEventLoop) -> None:
+    # A session can only be closed on the loop it was created on
+    if loop.is_closed():
+        session.detach()
+    else:
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+
+
+async def get_session() -> aiohttp.ClientSession:
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        if _session is not None and not _session.closed and _session_loop is not None:
+            _discard_session(_session, _session_loop)
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=50, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=15)
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_session() -> None:
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+@atexit.register
+def _close_session_at_exit() -> None:
+    # Process shutdown hook for runtimes that drive `graph` without calling main()
+    global _session, _session_loop
+    if _session is None or _session.closed or _session_loop is None:
+        return
+    if _session_loop.is_closed():
+        _session.detach()
+    elif not _session_loop.is_running():
+        _session_loop.run_until_complete(_session.close())
+    else:
+        _discard_session(_session, _session_loop)
+    _session = None
+    _session_loop = None
+
+
 # ---------------------------------------------------------------------------
 # 2️⃣ STATE & MODELS
 # ---------------------------------------------------------------------------
@@ -78,6 +175,7 @@ class GraphState(TypedDict, total=False):
     articles: List[Article]
     top_articles: List[Article]
     rewritten_tweets: List[str]
+    failed_rewrites: List[int]  # indices into rewritten_tweets whose rewrite failed
     auto_post: bool
     num_tweets_to_post: int
     tweet_results: List[TweetResult]
@@ -86,178 +184,473 @@ class GraphState(TypedDict, total=False):
 # ---------------------------------------------------------------------------
 # 3️⃣ SCORING HELPERS
 # ---------------------------------------------------------------------------
+TOP_ARTICLES = 5
+
 TRUSTED_SOURCES = {
     "BBC News": 10, "Reuters": 10, "Associated Press": 10, "The Guardian": 9,
     "CNN": 8, "The New York Times": 9, "Al Jazeera": 8, "The Washington Post": 9,
     "Bloomberg": 8, "CNBC": 7, "Financial Times": 9, "NPR": 8, "The Wall Street Journal": 9,
 }
 
-def calculate_recency_score(published_at: str) -> float:
+# Recency step function: age <= threshold[i] hours scores _RECENCY_SCORES[i]
+_RECENCY_THRESHOLDS = (6, 24, 48, 168)
+_RECENCY_SCORES = (10, 8, 6, 4, 2)
+
+def published_epoch(published_at: str) -> float:
+    """Seconds since epoch for an ISO timestamp, or NaN if it can't be parsed."""
     try:
-        pub_date = datetime.fromisoformat(published_at.replace('Z', '+00:00'))
-        hours_old = (datetime.now(timezone.utc) - pub_date).total_seconds() / 3600
-        if hours_old <= 6: return 10
-        elif hours_old <= 24: return 8
-        elif hours_old <= 48: return 6
-        elif hours_old <= 168: return 4
-        else: return 2
-    except:
+        return ciso8601.parse_datetime(published_at).timestamp()
+    except (TypeError, ValueError):
+        return float("nan")
+
+def calculate_recency_score(published_at: str, now_ts: float) -> float:
+    pub_ts = published_epoch(published_at)
+    if math.isnan(pub_ts):
         return 3
+    hours_old = (now_ts - pub_ts) / 3600
+    # bisect_left keeps the inclusive "<=" boundaries
+    return _RECENCY_SCORES[bisect.bisect_left(_RECENCY_THRESHOLDS, hours_old)]
 
 def has_image_bonus(url: Optional[str]) -> float:
     return 2.0 if url else 0.0
 
 
+# ---------------------------------------------------------------------------
+# 🧠 LLM RESPONSE CACHE
+# ---------------------------------------------------------------------------
+class LLMCache:
+    """In-memory TTL cache for LLM completions, keyed by model + messages."""
+
+    def __init__(self):
+        self._store: dict = {}
+
+    @staticmethod
+    def make_key(model: str, system: str, prompt: str) -> str:
+        payload = json.dumps({"model": model, "system": system, "prompt": prompt}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._store[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: int = 86400) -> None:
+        self._store[key] = (value, time.monotonic() + ttl)
+
+    async def delete(self, key: str) -> None:
+        self._store.pop(key, None)
+
+
+llm_cache = LLMCache()
+
+REWRITE_SYSTEM_PROMPT = "You are an expert journalist summarizing news for social media."
+_MD_LINK_RE = re.compile(r'\[([^\]]+)\]\([^)]+\)')
+_CODE_FENCE_RE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def rewrite_cache_key(prompt: str) -> str:
+    return LLMCache.make_key(LLM_MODEL, REWRITE_SYSTEM_PROMPT, prompt)
+
+
+async def cached_rewrite(prompt: str) -> str:
+    key = rewrite_cache_key(prompt)
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        return cached
+    output = await llm.ainvoke([
+        SystemMessage(REWRITE_SYSTEM_PROMPT),
+        HumanMessage(prompt)
+    ])
+    await llm_cache.set(key, output.content, ttl=86400)
+    return output.content
+
+
+MAX_IMAGE_BYTES = 4_000_000
+IMAGE_CHUNK_SIZE = 65536
+
+
+async def fetch_image(url: str) -> bytes:
+    session = await get_session()
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+        if resp.status != 200:
+            raise ValueError(f"HTTP {resp.status}")
+        if not resp.content_type.startswith("image/"):
+            raise ValueError(f"not an image ({resp.content_type})")
+        if (resp.content_length or 0) > MAX_IMAGE_BYTES:
+            raise ValueError(f"image too large ({resp.content_length} bytes)")
+
+        # Stream with a hard cap in case Content-Length is missing or wrong
+        buf = bytearray()
+        async for chunk in resp.content.iter_chunked(IMAGE_CHUNK_SIZE):
+            buf += chunk
+            if len(buf) > MAX_IMAGE_BYTES:
+                raise ValueError(f"image exceeds {MAX_IMAGE_BYTES} bytes")
+        return bytes(buf)
+
+
+# NewsAPI response cache: url -> {"fetched_at", "etag", "last_modified", "items"}
+NEWS_CACHE_TTL = 300
+NEWS_STREAM_CHUNK_SIZE = 65536
+_news_cache: dict = {}
+
+
+async def iter_news_items(url: str):
+    """Yield raw NewsAPI article dicts, streaming them from the response as they arrive."""
+    entry = _news_cache.get(url)
+    if entry and time.monotonic() - entry["fetched_at"] < NEWS_CACHE_TTL:
+        print("♻️ Using cached NewsAPI response")
+        for item in entry["items"]:
+            yield item
+        return
+
+    # Revalidate a stale entry so NewsAPI can answer 304 with an empty body
+    headers = {}
+    if entry:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    session = await get_session()
+    async with session.get(url, headers=headers) as resp:
+        if resp.status == 304 and entry:
+            entry["fetched_at"] = time.monotonic()
+            print("♻️ NewsAPI returned 304, reusing cached response")
+            for item in entry["items"]:
+                yield item
+            return
+        if resp.status != 200:
+            print(f"⚠️ NewsAPI returned HTTP {resp.status}")
+
+        items = []
+        parsed = ijson.sendable_list()
+        parser = ijson.items_coro(parsed, "articles.item")
+        async for chunk in resp.content.iter_chunked(NEWS_STREAM_CHUNK_SIZE):
+            parser.send(chunk)
+            for item in parsed:
+                items.append(item)
+                yield item
+            del parsed[:]
+        parser.close()
+        for item in parsed:
+            items.append(item)
+            yield item
+
+        if resp.status == 200:
+            _news_cache[url] = {
+                "fetched_at": time.monotonic(),
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "items": items,
+            }
+
+
+def article_prompt_block(article: Article) -> str:
+    return f"Title: {article.title}\nDescription: {article.description}\nSource: {article.source}"
+
+
+def build_batch_prompt(articles: List[Article]) -> str:
+    n = len(articles)
+    return (
+        f"For each of the following {n} articles, write a factual, engaging tweet "
+        "(max 250 characters, no URLs/markdown). Summarize the key point and make it eye-catching.\n"
+        f"Respond only with a JSON array of exactly {n} strings, in the same order as the articles.\n\n"
+        + "\n\n".join(f"{i}. {article_prompt_block(a)}" for i, a in enumerate(articles, 1))
+    )
+
+
+def parse_tweet_batch(content: str, expected: int) -> Optional[List[str]]:
+    try:
+        tweets = orjson.loads(_CODE_FENCE_RE.sub("", content.strip()))
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(tweets, list) or len(tweets) != expected:
+        return None
+    if not all(isinstance(t, str) for t in tweets):
+        return None
+    return tweets
+
+
 # ---------------------------------------------------------------------------
 # 4️⃣ NODES
 # ---------------------------------------------------------------------------
 
 # 🟩 Node 1: Fetch News (with topic + source logging)
 async def fetch_news(state: GraphState) -> dict:
-    topic = state.get("topic", "india")
-    api_key = os.getenv("News_Api_Key")
-    if not api_key:
+    topic = state.get("topic", CFG.topic_default)
+    if not CFG.news_api_key:
         raise ValueError("Missing News_Api_Key in .env")
 
-    url = f"https://newsapi.org/v2/everything?q={topic}&language=en&pageSize=20&sortBy=publishedAt&apiKey={api_key}"
+    url = _NEWS_URL_TEMPLATE.format(topic=quote_plus(topic), key=CFG.news_api_key)
 
     print(f"📰 Fetching top news for topic: {topic}")
 
-    articles = []
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            data = await resp.json()
-            for article in data.get("articles", []):
-                if article.get("title"):
-                    articles.append(Article(
-                        title=article.get("title", ""),
-                        description=article.get("description", ""),
-                        source=article.get("source", {}).get("name", "Unknown"),
-                        author=article.get("author"),
-                        url=article.get("url", ""),
-                        published_at=article.get("publishedAt", ""),
-                        image_url=article.get("urlToImage")
-                    ))
-
-    print(f"✅ Total articles fetched: {len(articles)}")
+    # Score each article as it is built and keep only the best 5 in a min-heap of
+    # (score, -seq, article); -seq makes ties favour earlier articles like a stable sort
+    now_ts = datetime.now(timezone.utc).timestamp()
+    heap = []
+    preview = []
+    total_fetched = 0
+    async for article in iter_news_items(url):
+        if not article.get("title"):
+            continue
+        # Fields come straight from NewsAPI's typed payload, so skip validation
+        art = Article.model_construct(
+            title=article.get("title", ""),
+            description=article.get("description") or "",
+            source=(article.get("source") or {}).get("name", "Unknown"),
+            author=article.get("author"),
+            url=article.get("url", ""),
+            published_at=article.get("publishedAt", ""),
+            image_url=article.get("urlToImage")
+        )
+        src_score = TRUSTED_SOURCES.get(art.source, 5)
+        recency = calculate_recency_score(art.published_at, now_ts)
+        score = src_score + recency + has_image_bonus(art.image_url)
+        entry = (score, -total_fetched, art, f"source={src_score}, recency={recency}")
+        if len(heap) < TOP_ARTICLES:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+        if len(preview) < 5:
+            preview.append(art)
+        total_fetched += 1
+
+    print(f"✅ Total articles fetched: {total_fetched}")
     print(f"📍 Showing first 5 sources for topic '{topic}':")
-    for i, art in enumerate(articles[:5], start=1):
+    for i, art in enumerate(preview, start=1):
         print(f"   {i}. {art.source} — {art.title[:80]}")
 
-    return {"articles": articles}
+    top_articles = []
+    for score, _, art, reason in sorted(heap, key=lambda e: e[:2], reverse=True):
+        art.priority_score = float(score)
+        art.priority_reason = reason
+        top_articles.append(art)
+
+    return {"top_articles": top_articles}
 
 
-# 🟨 Node 2: Prioritize
-async def prioritize_articles(state: GraphState) -> dict:
-    articles = state.get("articles", [])
-    for article in articles:
-        src_score = TRUSTED_SOURCES.get(article.source, 5)
-        recency = calculate_recency_score(article.published_at)
-        total = src_score + recency + has_image_bonus(article.image_url)
-        article.priority_score = total
-        article.priority_reason = f"source={src_score}, recency={recency}"
-    sorted_articles = sorted(articles, key=lambda x: x.priority_score, reverse=True)
-    top_articles = sorted_articles[:5]
+# 🟨 Node 2: Prioritize (scoring is fused into fetch_news; kept as a graph step)
+def prioritize_articles(state: GraphState) -> dict:
+    top_articles = state.get("top_articles", [])
     print(f"🏆 Selected top {len(top_articles)} articles")
     return {"top_articles": top_articles}
 
 
-# 🟦 Node 3: Rewrite
+# 🟦 Node 3: Rewrite (one batched LLM call, per-article fallback)
 async def rewrite_news(state: GraphState) -> dict:
     top_articles = state.get("top_articles", [])
+    if not top_articles:
+        print("✍️ Rewrote 0 tweets")
+        return {"rewritten_tweets": [], "failed_rewrites": []}
+
+    outputs = None
+    batch_prompt = build_batch_prompt(top_articles)
+    try:
+        outputs = parse_tweet_batch(await cached_rewrite(batch_prompt), len(top_articles))
+        if outputs is None:
+            # Don't keep serving an unparseable response from the cache
+            await llm_cache.delete(rewrite_cache_key(batch_prompt))
+            print("⚠️ Batched rewrite returned invalid JSON, falling back to per-article calls")
+    except Exception as e:
+        print(f"⚠️ Batched rewrite failed: {e}, falling back to per-article calls")
+
+    if outputs is None:
+        tasks = []
+        for article in top_articles:
+            prompt = (
+                "Write a factual, engaging tweet (max 250 characters, no URLs/markdown). "
+                "Summarize the key point and make it eye-catching.\n\n"
+                + article_prompt_block(article)
+            )
+            tasks.append(cached_rewrite(prompt))
+
+        # gather preserves input order, so tweets stay aligned with top_articles
+        outputs = await asyncio.gather(*tasks, return_exceptions=True)
+
     rewritten = []
-    for article in top_articles:
-        prompt = (
-            "Write a factual, engaging tweet (max 250 characters, no URLs/markdown). "
-            "Summarize the key point and make it eye-catching.\n\n"
-            f"Title: {article.title}\nDescription: {article.description}\nSource: {article.source}"
-        )
-        output = await llm.ainvoke([
-            SystemMessage("You are an expert journalist summarizing news for social media."),
-            HumanMessage(prompt)
-        ])
-        tweet_text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', output.content.strip())
+    failed = []
+    for i, (article, output) in enumerate(zip(top_articles, outputs), 1):
+        if isinstance(output, BaseException):
+            # Keep the slot so tweets stay aligned with top_articles; never post raw headlines
+            print(f"⚠️ Rewrite failed for article {i}: {output}, it will be skipped")
+            rewritten.append("")
+            failed.append(i - 1)
+            continue
+        tweet_text = _MD_LINK_RE.sub(r'\1', output.strip())
         rewritten.append(tweet_text[:250])
-    print(f"✍️ Rewrote {len(rewritten)} tweets")
-    return {"rewritten_tweets": rewritten}
+    print(f"✍️ Rewrote {len(rewritten) - len(failed)} tweets")
+    return {"rewritten_tweets": rewritten, "failed_rewrites": failed}
 
 
-# 🟥 Node 4: Post to Twitter (with image fallback and strict count)
-async def post_to_twitter(state: GraphState) -> dict:
-    tweets = state.get("rewritten_tweets", [])
-    articles = state.get("top_articles", [])
+TWEET_POST_CONCURRENCY = 3
+RETRYABLE_TWITTER_ERRORS = (tweepy.errors.TooManyRequests, tweepy.errors.TwitterServerError)
+# create_tweet isn't idempotent: a 5xx may arrive after the post went live, so only retry 429s
+RETRYABLE_CREATE_TWEET_ERRORS = (tweepy.errors.TooManyRequests,)
 
-    # ✅ Handle both string and bool for auto_post
-    raw_auto_post = state.get("auto_post", False)
-    if isinstance(raw_auto_post, str):
-        auto_post = raw_auto_post.lower() == "true"
-    else:
-        auto_post = bool(raw_auto_post)
 
-    num_to_post = int(state.get("num_tweets_to_post", 1))
-    tweet_results = []
+def _rate_limit_reset_delay(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    reset = headers.get("x-rate-limit-reset")
+    if not reset:
+        return None
+    try:
+        return max(0.0, float(reset) - time.time())
+    except ValueError:
+        return None
 
-    if not auto_post:
-        print("⚠️ Auto-post disabled — showing preview only")
-        for t in tweets[:num_to_post]:
-            tweet_results.append(TweetResult(tweet_text=t, success=False, error="Auto-post disabled"))
-        return {"tweet_results": tweet_results}
 
-    if not twitter_client or not twitter_api_v1:
-        raise Exception("Twitter clients not initialized properly")
+async def with_backoff(fn, *args, max_attempts: int = 5, base: float = 1.0,
+                       retry_on: tuple = RETRYABLE_TWITTER_ERRORS, **kwargs):
+    """Run a blocking Twitter call in a thread, retrying `retry_on` errors with exponential backoff."""
+    for attempt in range(max_attempts):
+        try:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        except retry_on as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = None
+            if isinstance(e, tweepy.errors.TooManyRequests):
+                delay = _rate_limit_reset_delay(e)
+            if delay is None:
+                delay = min(60, base * 2 ** attempt)
+            delay += random.random()
+            print(f"⏳ Twitter API {type(e).__name__}, retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{max_attempts})")
+            await asyncio.sleep(delay)
+
+
+def _upload_image(img_bytes: bytes):
+    # Upload straight from memory; filename is only used to infer the media type
+    return twitter_api_v1.media_upload(filename="image.jpg", file=io.BytesIO(img_bytes))
+
+
+def _rewrite_failed_result(i: int, article: Article) -> TweetResult:
+    return TweetResult.model_construct(
+        tweet_text=article.url,
+        success=False,
+        error=f"Rewrite failed for article {i}: {article.title[:80]}"
+    )
 
-    print(f"🐦 Posting up to {num_to_post} tweets with image fallback...")
 
-    # ✅ Strictly limit tweets and articles
-    tweets_to_post = tweets[:num_to_post]
-    articles_to_post = articles[:num_to_post]
+async def _post_one(i: int, tweet: Optional[str], article: Article, img_bytes: Optional[bytes],
+                    semaphore: asyncio.Semaphore) -> TweetResult:
+    if tweet is None:
+        print(f"⏭️ Skipping tweet {i}: rewrite failed")
+        return _rewrite_failed_result(i, article)
 
-    for i, (tweet, article) in enumerate(zip(tweets_to_post, articles_to_post), 1):
-        full_tweet = f"{tweet}\n\n{article.url}"
-        media_id = None
+    full_tweet = f"{tweet}\n\n{article.url}"
+    media_id = None
 
+    async with semaphore:
         # 🖼️ Try uploading image (fallback if fails)
-        if article.image_url:
+        if img_bytes:
             try:
-                resp = requests.get(article.image_url, timeout=10)
-                if resp.status_code == 200:
-                    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
-                        tmp.write(resp.content)
-                        tmp.flush()
-                        media = twitter_api_v1.media_upload(tmp.name)
-                        media_id = media.media_id
-                        print(f"🖼️ Uploaded image for tweet {i}")
-                else:
-                    print(f"⚠️ Image fetch failed ({resp.status_code}) for tweet {i}, using text-only fallback")
+                media = await with_backoff(_upload_image, img_bytes)
+                media_id = media.media_id
+                print(f"🖼️ Uploaded image for tweet {i}")
             except Exception as e:
                 print(f"⚠️ Image upload failed for tweet {i}: {e}")
 
         # 🐦 Try posting the tweet (fallback to text-only if media fails)
         try:
             if media_id:
-                resp = twitter_client.create_tweet(text=full_tweet, media_ids=[media_id])
+                resp = await with_backoff(
+                    twitter_client.create_tweet, text=full_tweet, media_ids=[media_id],
+                    retry_on=RETRYABLE_CREATE_TWEET_ERRORS
+                )
                 print(f"✅ Posted tweet {i} with image")
             else:
-                resp = twitter_client.create_tweet(text=full_tweet)
+                resp = await with_backoff(
+                    twitter_client.create_tweet, text=full_tweet,
+                    retry_on=RETRYABLE_CREATE_TWEET_ERRORS
+                )
                 print(f"✅ Posted tweet {i} (text-only fallback)")
 
             tweet_id = resp.data["id"]
             tweet_url = f"https://x.com/user/status/{tweet_id}"
-            tweet_results.append(TweetResult(
+            return TweetResult.model_construct(
                 tweet_text=full_tweet,
                 tweet_id=tweet_id,
                 tweet_url=tweet_url,
                 success=True
-            ))
+            )
         except Exception as e:
-            tweet_results.append(TweetResult(
+            print(f"❌ Error posting tweet {i}: {e}")
+            return TweetResult.model_construct(
                 tweet_text=full_tweet,
                 success=False,
                 error=str(e)
-            ))
-            print(f"❌ Error posting tweet {i}: {e}")
+            )
 
-    return {"tweet_results": tweet_results}
+
+# 🟥 Node 4: Post to Twitter (with image fallback and strict count)
+async def post_to_twitter(state: GraphState) -> dict:
+    # Failed rewrites become None so they are reported but never posted
+    failed = set(state.get("failed_rewrites", []))
+    tweets = [None if idx in failed else t for idx, t in enumerate(state.get("rewritten_tweets", []))]
+
+    # ✅ Handle both string and bool for auto_post
+    raw_auto_post = state.get("auto_post", False)
+    if isinstance(raw_auto_post, str):
+        auto_post = raw_auto_post.lower() == "true"
+    else:
+        auto_post = bool(raw_auto_post)
+
+    num_to_post = int(state.get("num_tweets_to_post", 1))
+
+    if not auto_post:
+        print("⚠️ Auto-post disabled — showing preview only")
+        # top_articles is only needed to label failed rewrites
+        articles = state.get("top_articles", []) if failed else []
+        return {"tweet_results": [
+            TweetResult.model_construct(tweet_text=t, success=False, error="Auto-post disabled")
+            if t is not None else
+            _rewrite_failed_result(i, articles[i - 1])
+            for i, t in enumerate(tweets[:num_to_post], 1)
+        ]}
+
+    articles = state.get("top_articles", [])
+    if not twitter_client or not twitter_api_v1:
+        raise Exception("Twitter clients not initialized properly")
+
+    print(f"🐦 Posting up to {num_to_post} tweets with image fallback...")
+
+    # ✅ Strictly limit tweets and articles
+    tweets_to_post = tweets[:num_to_post]
+    articles_to_post = articles[:num_to_post]
+
+    # 🖼️ Prefetch all images concurrently before posting
+    img_indices = [
+        i for i, (t, a) in enumerate(zip(tweets_to_post, articles_to_post), 1)
+        if t is not None and a.image_url
+    ]
+    img_results = await asyncio.gather(
+        *(fetch_image(articles_to_post[i - 1].image_url) for i in img_indices),
+        return_exceptions=True
+    )
+    images = {}
+    for i, result in zip(img_indices, img_results):
+        if isinstance(result, BaseException):
+            print(f"⚠️ Image fetch failed ({result}) for tweet {i}, using text-only fallback")
+        else:
+            images[i] = result
+
+    # 🐦 Post concurrently, capped to avoid tripping write rate limits
+    semaphore = asyncio.Semaphore(TWEET_POST_CONCURRENCY)
+    tweet_results = await asyncio.gather(*(
+        _post_one(i, tweet, article, images.get(i), semaphore)
+        for i, (tweet, article) in enumerate(zip(tweets_to_post, articles_to_post), 1)
+    ))
+
+    return {"tweet_results": list(tweet_results)}
 
 # ---------------------------------------------------------------------------
 # 5️⃣ BUILD THE GRAPH
@@ -281,9 +674,9 @@ graph = builder.compile()
 # 6️⃣ ENTRYPOINT
 # ---------------------------------------------------------------------------
 async def main():
-    topic = os.getenv("NEWS_TOPIC", "india")
-    auto_post = os.getenv("AUTO_POST_TWEETS", "false").lower() == "true"
-    num_tweets = int(os.getenv("NUM_TWEETS_TO_POST", "2"))
+    topic = CFG.topic_default
+    auto_post = CFG.auto_post
+    num_tweets = CFG.num_tweets
     print(f"🔍 Loaded NEWS_TOPIC from environment: {os.getenv('NEWS_TOPIC')}")
     print(f"🚀 Running news workflow for topic: {topic}")
 
@@ -292,15 +685,19 @@ async def main():
         "articles": [],
         "top_articles": [],
         "rewritten_tweets": [],
+        "failed_rewrites": [],
         "auto_post": auto_post,
         "num_tweets_to_post": num_tweets,
         "tweet_results": []
     }
 
     print(f"🚀 Running news workflow for topic: {topic}")
-    result = await graph.ainvoke(input_state)
+    try:
+        result = await graph.ainvoke(input_state)
+    finally:
+        await close_session()
     print("\n✅ Flow finished.")
-    print(f"Tweets generated: {len(result['rewritten_tweets'])}")
+    print(f"Tweets generated: {len(result['rewritten_tweets']) - len(result.get('failed_rewrites', []))}")
     print(f"Tweets posted: {sum(1 for r in result['tweet_results'] if r.success)}")
 
 if __name__ == "__main__":